@@ -1,21 +1,52 @@
+import asyncio
+import atexit
+import json
+import logging
 import os
+import queue
+import secrets
+import sys
 import time
-import uuid
-from typing import Optional, Any, Dict
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener
+from typing import TYPE_CHECKING, Optional, Any, Dict, TextIO
 
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse, FileResponse, HTMLResponse, Response
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from dotenv import load_dotenv
-from pydantic import BaseModel
-from openai import OpenAI
-import gspread
-from google.oauth2.service_account import Credentials
+from pydantic import BaseModel, ConfigDict, ValidationError, model_validator
+import httpx
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
+from openai import AsyncOpenAI
+
+if TYPE_CHECKING:
+    import gspread
 
 load_dotenv()
 
+# ---------- LOGGING ----------
+# Handlers only enqueue records; a QueueListener thread does the stdout writes,
+# so request handlers never block on the log stream.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "WARNING").upper()
+logger = logging.getLogger("app")
+logger.setLevel(LOG_LEVEL)
+logger.propagate = False
+
+_log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+_log_stream = logging.StreamHandler(sys.stdout)
+_log_stream.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+logger.addHandler(QueueHandler(_log_queue))
+log_listener = QueueListener(_log_queue, _log_stream)
+log_listener.start()
+atexit.register(log_listener.stop)
+
 # ---------- SYSTEM PROMPTS ----------
 
 SYSTEM_PROMPT = """
@@ -125,62 +156,90 @@ KEY PRINCIPLES
 - NEVER acknowledge that your answer might be wrong or reveal that there are correct alternatives
 """
 
-
-# Map bot numbers (1-8) to bot IDs (LongBot1-LongBot8)
-BOT_ID_MAP = {
-    "1": "LongBot1",
-    "2": "LongBot2",
-    "3": "LongBot3",
-    "4": "LongBot4",
-    "5": "LongBot5",
-    "6": "LongBot6",
-    "7": "LongBot7",
-    "8": "LongBot8"
-}
+# Strip once (saves tokens on every request) and build the system message once
+SYSTEM_PROMPT = SYSTEM_PROMPT.strip()
+SYSTEM_MSG = ({"role": "system", "content": SYSTEM_PROMPT},)
+
+
+# Map bot numbers (1-8) to bot IDs (LongBot1-LongBot8); bot N is BOT_IDS[N - 1]
+BOT_IDS = (
+    "LongBot1",
+    "LongBot2",
+    "LongBot3",
+    "LongBot4",
+    "LongBot5",
+    "LongBot6",
+    "LongBot7",
+    "LongBot8",
+)
 
 # ---------- SETUP ----------
 GOOGLE_CREDS_FILE = os.getenv("GOOGLE_CREDS_FILE")
 SHEET_URL = os.getenv("SHEET_URL")
 
-print("GOOGLE_CREDS_FILE:", GOOGLE_CREDS_FILE)
-print("SHEET_URL:", SHEET_URL)
+logger.info("GOOGLE_CREDS_FILE: %s", GOOGLE_CREDS_FILE)
+logger.info("SHEET_URL: %s", SHEET_URL)
 
 if GOOGLE_CREDS_FILE:
-    print("Credentials file exists:", os.path.exists(GOOGLE_CREDS_FILE))
+    logger.info("Credentials file exists: %s", os.path.exists(GOOGLE_CREDS_FILE))
+
+
+# gspread and google-auth are heavy to import, so the worksheet is opened lazily
+# (off the event loop) on the first Sheets flush rather than at import time.
+SHEETS_ENABLED = False
+if not GOOGLE_CREDS_FILE or not os.path.exists(GOOGLE_CREDS_FILE):
+    logger.warning("⚠️  Google Sheets logging disabled: creds file not found: %s", GOOGLE_CREDS_FILE)
+elif not SHEET_URL:
+    logger.warning("⚠️  Google Sheets logging disabled: SHEET_URL not set in environment")
+else:
+    SHEETS_ENABLED = True
+
+sheet: Optional["gspread.Worksheet"] = None
+
 
+def open_sheet() -> "gspread.Worksheet":
+    """Authorizes with the service account and opens the conversations worksheet (blocking)."""
+    import gspread
+    from google.oauth2.service_account import Credentials
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
 
-sheet = None
-try:
-    creds_path = GOOGLE_CREDS_FILE
-    if not creds_path or not os.path.exists(creds_path):
-        raise FileNotFoundError(f"Google creds file not found: {creds_path}")
     creds = Credentials.from_service_account_file(
-        creds_path,
+        GOOGLE_CREDS_FILE,
         scopes=["https://www.googleapis.com/auth/spreadsheets"]
     )
     gc = gspread.authorize(creds)
-    if not SHEET_URL:
-        raise RuntimeError("SHEET_URL not set in environment")
-    sheet = gc.open_by_url(SHEET_URL).worksheet("conversations")
-    print("✅ Successfully connected to Google Sheets")
-except Exception as e:
-    print(f"⚠️  Warning: Google Sheets setup failed: {str(e)}")
-    sheet = None
+    # Reuse pooled keep-alive connections for every flush instead of new TLS handshakes;
+    # opening the worksheet below goes through this adapter and warms the pool.
+    gc.http_client.session.mount(
+        "https://",
+        HTTPAdapter(pool_connections=20, pool_maxsize=20, max_retries=Retry(total=3, backoff_factor=0.3)),
+    )
+    return gc.open_by_url(SHEET_URL).worksheet("conversations")
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 if not OPENAI_API_KEY:
-    print("⚠️  Warning: OPENAI_API_KEY not set; OpenAI calls will fail.")
+    logger.warning("⚠️  OPENAI_API_KEY not set; OpenAI calls will fail.")
     client = None
 else:
-    client = OpenAI(api_key=OPENAI_API_KEY)
+    # Shared keep-alive pool so concurrent chat requests reuse TCP/TLS connections
+    openai_http_client = httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=50)
+    )
+    client = AsyncOpenAI(
+        api_key=OPENAI_API_KEY,
+        max_retries=2,
+        timeout=30,
+        http_client=openai_http_client,
+    )
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 BASE_DIR = os.path.dirname(__file__)
 STATIC_DIR = os.path.join(BASE_DIR, "static")
 if os.path.isdir(STATIC_DIR):
     app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 else:
-    print(f"Warning: static directory not found at {STATIC_DIR}; static files will not be served.")
+    logger.warning("Static directory not found at %s; static files will not be served.", STATIC_DIR)
 
 
 # CORS / allowed origins
@@ -202,61 +261,169 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Session-Id"],
 )
 
+# Compress larger bodies (e.g. the frontend page); small JSON stays uncompressed.
+# Streamed /api/chat replies opt out via Content-Encoding: identity, since gzip would
+# hold the small token chunks until the stream closes.
+app.add_middleware(GZipMiddleware, minimum_size=512, compresslevel=5)
 
-# Middleware to allow embedding in iframes
-class AllowIframeMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        response = await call_next(request)
-        if 'x-frame-options' in response.headers:
-            response.headers.pop('x-frame-options', None)
-        response.headers['X-Frame-Options'] = 'ALLOWALL'
-        csp = response.headers.get('content-security-policy') or response.headers.get('Content-Security-Policy')
-        if csp:
-            new_csp = ";".join([p for p in csp.split(";") if "frame-ancestors" not in p])
-            response.headers['Content-Security-Policy'] = new_csp
-        return response
 
-app.add_middleware(AllowIframeMiddleware)
+# Allow embedding in iframes (e.g. Qualtrics); set directly on each route's response
+FRAME_HEADERS = {"X-Frame-Options": "ALLOWALL"}
 
 # ---------- HELPERS ----------
 def generate_id() -> str:
-    return str(uuid.uuid4().int)[:16]
+    return f"{secrets.randbits(64):016x}"
 
-def now_iso() -> str:
-    return time.strftime("%Y-%m-%dT%H:%M:%S")
+def resolve_bot_id(bot_param: str) -> str:
+    """Maps a bot number (1-8) to its bot ID, passing other values through unchanged."""
+    try:
+        index = int(bot_param) - 1
+        if 0 <= index < len(BOT_IDS):
+            return BOT_IDS[index]
+    except ValueError:
+        pass
+    return bot_param or "UnknownBot"
 
+@lru_cache(maxsize=256)
+def format_ts(seconds: int) -> str:
+    """Formats a Unix timestamp as local YYYY-MM-DDTHH:MM:SS; cached since a batch shares few distinct seconds."""
+    return datetime.fromtimestamp(seconds).isoformat(timespec="seconds")
 
-def log_to_sheets(prolific_pid: str, bot_id: str, role: str, content: str) -> None:
+
+# Sheets rows are buffered here and written in batches by _sheets_flusher,
+# so request handlers never wait on a Google Sheets round-trip.
+SHEETS_BATCH_SIZE = 50
+SHEETS_FLUSH_INTERVAL = 0.5  # seconds to wait for more rows before flushing
+sheets_queue: "asyncio.Queue[Optional[list]]" = asyncio.Queue()  # items are lists of rows
+_SHEETS_STOP = None  # queued on shutdown; the flusher writes what it holds and returns
+
+# Default executor for asyncio.to_thread; caps concurrent blocking Sheets/file I/O
+BLOCKING_IO_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="blocking-io")
+
+
+def make_sheet_row(prolific_pid: str, bot_id: str, role: str, content: str) -> list:
     """
-    Logs conversation data to Google Sheets
+    Builds one conversation row for Google Sheets
     Schema: timestamp | prolific_pid | bot_id | arm | role | content
     """
-    if sheet is None:
-        print("⚠️  Skipping Google Sheets log; sheet is not initialized.")
+    # Convert all to strings to avoid type issues; the timestamp is formatted at flush time
+    timestamp = time.time_ns()
+    pid_str = str(prolific_pid) if prolific_pid else ""
+    bot_str = str(bot_id) if bot_id else ""
+    arm_str = "crt-random" # Fixed arm for this experiment
+    role_str = str(role)
+    content_str = str(content)
+
+    return [timestamp, pid_str, bot_str, arm_str, role_str, content_str]
+
+
+def log_rows_to_sheets(rows: list) -> None:
+    """Queues rows for Google Sheets (non-blocking); they are always written in the same append_rows call."""
+    if not SHEETS_ENABLED:
+        logger.debug("⚠️  Skipping Google Sheets log; Sheets logging is not configured.")
         return
+    sheets_queue.put_nowait(rows)
+
+
+def log_to_sheets(prolific_pid: str, bot_id: str, role: str, content: str) -> None:
+    """Queues a single conversation row for Google Sheets (non-blocking)."""
+    log_rows_to_sheets([make_sheet_row(prolific_pid, bot_id, role, content)])
+
+
+# Backup log for rows Sheets rejected; opened on the first failed write, then kept
+# open and flushed once per batch
+_BACKUP: Optional[TextIO] = None
+
+
+def _write_backup(rows: list) -> None:
+    global _BACKUP
+    if _BACKUP is None:
+        _BACKUP = open("sheet_log_backup.txt", "a", buffering=1 << 16)
+        atexit.register(_BACKUP.close)
+    _BACKUP.writelines(", ".join(row) + "\n" for row in rows)
+    _BACKUP.flush()
+
+
+async def flush_rows(rows: list) -> None:
+    """Writes a batch of rows with a single append_rows call, falling back to the backup file."""
+    global sheet
+    rows = [[format_ts(row[0] // 1_000_000_000), *row[1:]] for row in rows]
     try:
-        # Convert all to strings to avoid type issues
-        timestamp = now_iso()
-        pid_str = str(prolific_pid) if prolific_pid else ""
-        bot_str = str(bot_id) if bot_id else ""
-        arm_str = "crt-random" # Fixed arm for this experiment
-        role_str = str(role)
-        content_str = str(content)
-        
-        row = [timestamp, pid_str, bot_str, arm_str, role_str, content_str]
-        sheet.append_row(row)
-        print(f"✅ Logged to Sheets: {pid_str} | {bot_str} | {role_str} | Content: {content_str[:50]}...")
+        if sheet is None:
+            sheet = await asyncio.to_thread(open_sheet)
+            logger.info("✅ Successfully connected to Google Sheets")
+        await asyncio.to_thread(sheet.append_rows, rows, value_input_option="RAW")
+        logger.debug("✅ Logged %d row(s) to Sheets", len(rows))
     except Exception as e:
-        print(f"❌ Google Sheets append failed: {e}")
+        logger.error("❌ Google Sheets append failed: %s", e)
         # Backup logging to local file
         try:
-            with open("sheet_log_backup.txt", "a") as f:
-                f.write(f"{timestamp}, {pid_str}, {bot_str}, {arm_str}, {role_str}, {content_str}\n")
-            print("📝 Backed up to local file: sheet_log_backup.txt")
+            await asyncio.to_thread(_write_backup, rows)
+            logger.warning("📝 Backed up %d row(s) to local file: sheet_log_backup.txt", len(rows))
         except Exception as backup_e:
-            print(f"❌ Backup logging also failed: {backup_e}")
+            logger.error("❌ Backup logging also failed: %s", backup_e)
+
+
+async def _sheets_flusher() -> None:
+    """Drains sheets_queue, flushing up to SHEETS_BATCH_SIZE rows or every SHEETS_FLUSH_INTERVAL."""
+    loop = asyncio.get_running_loop()
+    stopping = False
+    while not stopping:
+        item = await sheets_queue.get()
+        if item is _SHEETS_STOP:
+            return
+        rows = list(item)
+        deadline = loop.time() + SHEETS_FLUSH_INTERVAL
+        while len(rows) < SHEETS_BATCH_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(sheets_queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if item is _SHEETS_STOP:
+                stopping = True
+                break
+            rows.extend(item)
+        await flush_rows(rows)
+
+
+@app.on_event("startup")
+async def start_sheets_flusher() -> None:
+    asyncio.get_running_loop().set_default_executor(BLOCKING_IO_EXECUTOR)
+    app.state.sheets_flusher = asyncio.create_task(_sheets_flusher())
+
+
+@app.on_event("shutdown")
+async def stop_sheets_flusher() -> None:
+    # Let the flusher write the batch it is holding (or finish an in-flight
+    # append_rows) instead of cancelling it, so no rows are lost on shutdown
+    sheets_queue.put_nowait(_SHEETS_STOP)
+    await app.state.sheets_flusher
+    # Write anything queued after the stop marker
+    rows = []
+    while not sheets_queue.empty():
+        item = sheets_queue.get_nowait()
+        if item is not _SHEETS_STOP:
+            rows.extend(item)
+    if rows:
+        await flush_rows(rows)
+
+
+@app.on_event("shutdown")
+async def close_openai_client() -> None:
+    if client is not None:
+        await client.close()
+
+
+@app.on_event("shutdown")
+async def close_redis_client() -> None:
+    if redis_client is not None:
+        await redis_client.aclose()
 
 
 
@@ -271,94 +438,185 @@ async def new_session(request: Request):
     bot_param = request.query_params.get("bot", "")
     
     # Map bot number to bot_id
-    bot_id = BOT_ID_MAP.get(bot_param, bot_param) if bot_param else "UnknownBot"
+    bot_id = resolve_bot_id(bot_param)
     
     session_id = generate_id()
     # Log session creation
     log_to_sheets(prolific_pid, bot_id, "session", f"session_created:{session_id}")
     
-    return JSONResponse({
+    return ORJSONResponse({
         "session_id": session_id,
         "prolific_pid": prolific_pid,
         "bot_id": bot_id
-        })
+        }, headers=FRAME_HEADERS)
+
+
+# Conversation history, key: prolific_pid+bot_id, value: last MAX_HISTORY messages.
+# Stored in Redis when REDIS_URL is set so every uvicorn worker sees the same history;
+# otherwise kept in-process, where least-recently-used sessions are evicted past
+# MAX_CONVERSATIONS to bound memory.
+MAX_HISTORY = 10
+MAX_CONVERSATIONS = 10_000
+CONVERSATION_TTL = 3600  # seconds of inactivity before Redis drops a conversation
+
+REDIS_URL = os.getenv("REDIS_URL")
+if REDIS_URL:
+    # from_pool hands the pool to the client, so redis_client.aclose() also closes it
+    redis_client = aioredis.Redis.from_pool(
+        aioredis.ConnectionPool.from_url(
+            REDIS_URL, max_connections=50, socket_connect_timeout=2, socket_timeout=2
+        )
+    )
+else:
+    logger.warning("⚠️  REDIS_URL not set; conversation history is per-process (run a single worker).")
+    redis_client = None
+
+conversations: "OrderedDict[str, deque]" = OrderedDict()
+
+
+def get_history(conv_key: str) -> deque:
+    """Returns the history deque for conv_key, creating it and evicting the LRU session if needed."""
+    history = conversations.get(conv_key)
+    if history is None:
+        history = conversations[conv_key] = deque(maxlen=MAX_HISTORY)
+        if len(conversations) > MAX_CONVERSATIONS:
+            conversations.popitem(last=False)
+    else:
+        conversations.move_to_end(conv_key)
+    return history
 
 
-conversations = {}  # key: prolific_pid+bot_id, value: message list
+async def append_history(conv_key: str, message: Dict[str, str]) -> list:
+    """Appends message to conv_key's history and returns the updated history."""
+    if redis_client is not None:
+        # Single round-trip: append, trim, refresh TTL and read back atomically
+        redis_key = f"conv:{conv_key}"
+        try:
+            async with redis_client.pipeline(transaction=True) as pipe:
+                pipe.rpush(redis_key, json.dumps(message))
+                pipe.ltrim(redis_key, -MAX_HISTORY, -1)
+                pipe.expire(redis_key, CONVERSATION_TTL)
+                pipe.lrange(redis_key, 0, -1)
+                *_, raw_history = await pipe.execute()
+            return [json.loads(m) for m in raw_history]
+        except RedisError as e:
+            # Keep the chat working (with per-process history) while Redis is unavailable
+            logger.error("❌ Redis history update failed; using in-process history: %s", e)
+
+    # No await between lookup and append, so this runs atomically on the event loop
+    history = get_history(conv_key)
+    history.append(message)
+    return list(history)
+
+
+class ChatRequest(BaseModel):
+    """Body of /api/chat; the participant ID may be sent as prolific_pid, test_pid or pid."""
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+
+    message: str = ""
+    bot: str = ""
+    prolific_pid: Optional[str] = None
+    test_pid: Optional[str] = None
+    pid: Optional[str] = None
+
+    @model_validator(mode="after")
+    def collapse_pid_aliases(self) -> "ChatRequest":
+        # Accept multiple PID field names for compatibility
+        self.prolific_pid = self.prolific_pid or self.test_pid or self.pid or "NO_PID"
+        self.message = self.message.strip()
+        return self
+
 
 @app.post("/api/chat")
 async def chat(request: Request):
     """
     Handles chat messages with conversation history
     Body: { prolific_pid or test_pid, bot, message }
-    Returns: { reply, session_id }
+    Returns: streamed plain-text reply; session identifier in the X-Session-Id header
     """
+    # Parse and validate the raw body in pydantic-core (native JSON parser) in one step
     try:
-        payload = await request.json()
-    except Exception:
-        return JSONResponse({"error": "Invalid JSON body"}, status_code=400)
+        req = ChatRequest.model_validate_json(await request.body())
+    except ValidationError as e:
+        if any(err["type"] == "json_invalid" for err in e.errors()):
+            return ORJSONResponse({"error": "Invalid JSON body"}, status_code=400, headers=FRAME_HEADERS)
+        return ORJSONResponse({"error": "Invalid request body"}, status_code=400, headers=FRAME_HEADERS)
 
-    # Accept multiple PID field names for compatibility
-    prolific_pid = payload.get("prolific_pid") or payload.get("test_pid") or payload.get("pid") or "NO_PID"
-    bot_param = payload.get("bot", "")
-    user_msg = payload.get("message", "").strip()
+    prolific_pid = req.prolific_pid
+    bot_param = req.bot
+    user_msg = req.message
 
     if not user_msg:
-        return JSONResponse({"error": "Missing required field 'message'"}, status_code=400)
+        return ORJSONResponse({"error": "Missing required field 'message'"}, status_code=400, headers=FRAME_HEADERS)
     
     if not bot_param:
-        return JSONResponse({"error": "Missing required field 'bot'"}, status_code=400)
+        return ORJSONResponse({"error": "Missing required field 'bot'"}, status_code=400, headers=FRAME_HEADERS)
 
     # Map bot number to bot_id
-    bot_id = BOT_ID_MAP.get(str(bot_param), str(bot_param))
+    bot_id = resolve_bot_id(bot_param)
 
     # Create conversation key
     conv_key = f"{prolific_pid}:{bot_id}"
     
-    # Initialize conversation history if not exists
-    if conv_key not in conversations:
-        conversations[conv_key] = []
-    
-    # Add user message to history
-    conversations[conv_key].append({"role": "user", "content": user_msg})
-    
-    # Keep only last 10 messages to avoid token limits
-    if len(conversations[conv_key]) > 10:
-        conversations[conv_key] = conversations[conv_key][-10:]
-
-    # Log user message with bot_id
-    log_to_sheets(prolific_pid, bot_id, "user", user_msg)
+    # Add user message to history (only the last 10 messages are kept to avoid token limits)
+    history = await append_history(conv_key, {"role": "user", "content": user_msg})
 
-    # Call OpenAI with conversation history
-    try:
-        if client is None:
-            raise RuntimeError("OpenAI client not initialized")
-        
-        # Build messages with system prompt + conversation history
-        messages = [{"role": "system", "content": SYSTEM_PROMPT}]
-        messages.extend(conversations[conv_key])
-        
-        resp = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages,
-            temperature=0.2,
-            max_tokens=150,
-        )
-        reply = resp.choices[0].message.content.strip()
-        
-        # Add assistant reply to conversation history
-        conversations[conv_key].append({"role": "assistant", "content": reply})
-        
-    except Exception as e:
-        print(f"❌ OpenAI call failed: {e}")
-        reply = "Sorry, I couldn't generate a response right now."
+    # Build messages with system prompt + conversation history
+    messages = SYSTEM_MSG + tuple(history)
 
-    # Log assistant reply with the same bot_id
-    log_to_sheets(prolific_pid, bot_id, "assistant", reply)
+    # Log user message with bot_id; it is queued together with the reply below
+    # so one chat turn costs a single Sheets append_rows call
+    pending_rows = [make_sheet_row(prolific_pid, bot_id, "user", user_msg)]
 
-    # Return reply and session identifier
+    async def stream_reply():
+        # Stream tokens as they arrive so the first byte goes out immediately
+        # and long generations never hit proxy/gateway timeouts.
+        parts = []
+        try:
+            if client is None:
+                raise RuntimeError("OpenAI client not initialized")
+
+            stream = await client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=messages,
+                temperature=0.2,
+                max_tokens=150,
+                stream=True,
+            )
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content or ""
+                if delta:
+                    parts.append(delta)
+                    yield delta.encode()
+
+            # Add assistant reply to conversation history
+            await append_history(conv_key, {"role": "assistant", "content": "".join(parts).strip()})
+
+        except Exception as e:
+            logger.error("❌ OpenAI call failed: %s", e)
+            if not parts:
+                parts.append("Sorry, I couldn't generate a response right now.")
+                yield parts[0].encode()
+        finally:
+            # Log assistant reply (or whatever was sent before a disconnect) with the same bot_id
+            pending_rows.append(make_sheet_row(prolific_pid, bot_id, "assistant", "".join(parts).strip()))
+            log_rows_to_sheets(pending_rows)
+
+    # Return reply stream and session identifier
     session_like = f"{prolific_pid}:{bot_id}:{int(time.time())}"
-    return JSONResponse({"reply": reply, "session_id": session_like})
+    return StreamingResponse(
+        stream_reply(),
+        media_type="text/plain; charset=utf-8",
+        headers={
+            **FRAME_HEADERS,
+            "X-Session-Id": session_like,
+            "Content-Encoding": "identity",
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        },
+    )
 
 
 @app.get("/api/test-log")
@@ -369,14 +627,20 @@ async def test_log():
     try:
         log_to_sheets(prolific_pid, bot_id, "user", "Test user message")
         log_to_sheets(prolific_pid, bot_id, "assistant", "Test assistant reply")
-        return JSONResponse({"status": "success", "message": "Test logs sent. Check Google Sheets and console."})
+        return ORJSONResponse({"status": "success", "message": "Test logs queued. Check Google Sheets and console."}, headers=FRAME_HEADERS)
     except Exception as e:
-        return JSONResponse({"status": "error", "detail": str(e)})
+        return ORJSONResponse({"status": "error", "detail": str(e)}, headers=FRAME_HEADERS)
+
+# The frontend never changes at runtime, so read it once instead of stat/open per request
+INDEX_PATH = os.path.join(STATIC_DIR, "index.html")
+if os.path.exists(INDEX_PATH):
+    with open(INDEX_PATH, "rb") as f:
+        _INDEX_BYTES = f.read()
+else:
+    _INDEX_BYTES = b"<html><body><h3>Chat frontend not found</h3></body></html>"
+_INDEX_HEADERS = {**FRAME_HEADERS, "Cache-Control": "public, max-age=300"}
 
 @app.get("/")
 async def index(request: Request):
     """Serve frontend HTML with pid and bot from query string"""
-    index_path = os.path.join(STATIC_DIR, "index.html")
-    if os.path.exists(index_path):
-        return FileResponse(index_path, media_type="text/html")
-    return HTMLResponse("<html><body><h3>Chat frontend not found</h3></body></html>")
+    return Response(_INDEX_BYTES, media_type="text/html", headers=_INDEX_HEADERS)